@@ -1,12 +1,21 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
+from flask_orjson import OrjsonProvider
+from markupsafe import escape
 from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
+from twilio.http.http_client import TwilioHttpClient
+from requests.adapters import HTTPAdapter
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from apscheduler.schedulers.background import BackgroundScheduler
-import json
+import orjson
 import atexit
 import logging
+import threading
+import time
 import uuid
+from collections import defaultdict
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -15,6 +24,7 @@ logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Get environment variables or use defaults for local testing
 twilio_account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
@@ -25,31 +35,181 @@ twilio_whatsapp_number = os.environ.get('TWILIO_WHATSAPP_NUMBER')
 client = None
 if twilio_account_sid and twilio_auth_token:
     try:
-        client = Client(twilio_account_sid, twilio_auth_token)
+        # Keep HTTPS connections alive across sends, with room for every sender thread
+        twilio_http_client = TwilioHttpClient(pool_connections=True)
+        twilio_http_client.session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32))
+        client = Client(twilio_account_sid, twilio_auth_token, http_client=twilio_http_client)
         logger.info("Twilio client initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize Twilio client: {str(e)}")
 
+# Outgoing messages are blocking HTTPS calls, so bulk sends run on a thread pool
+_sender = ThreadPoolExecutor(max_workers=16, thread_name_prefix="twilio-sender")
+
+# Send a WhatsApp message through Twilio, backing off and retrying when rate limited
+def send_whatsapp_message(phone, body, attempts=4):
+    for attempt in range(attempts):
+        try:
+            return client.messages.create(
+                body=body,
+                from_=f"whatsapp:{twilio_whatsapp_number}",
+                to=f"whatsapp:{phone}"
+            )
+        except TwilioRestException as e:
+            if e.status != 429 or attempt == attempts - 1:
+                raise
+            delay = min(2 ** attempt, 30)
+            logger.warning(f"Twilio rate limit hit sending to {phone}, retrying in {delay}s")
+            time.sleep(delay)
+
+# Reminder message templates, as (without description, with description) pairs
+NOTIFY_TEMPLATES = (
+    "Hi {name}! This is a reminder about your cleaning task: {task}\nDue date: {due_date}",
+    "Hi {name}! This is a reminder about your cleaning task: {task}\nDetails: {description}\nDue date: {due_date}"
+)
+DUE_REMINDER_TEMPLATES = (
+    "Hi {name}! Reminder: Your cleaning task '{task}' is {urgency}.",
+    "Hi {name}! Reminder: Your cleaning task '{task}' is {urgency}.\nDetails: {description}"
+)
+
+# Build a reminder message body for a member's task in a single format call
+def format_task_message(templates, member, task, **fields):
+    template = templates[1] if task["description"] else templates[0]
+    return template.format(name=member["name"], task=task["name"],
+                           description=task["description"], **fields)
+
 # Data storage - we'll use in-memory storage with JSON backup for persistence
 DATA_FILE = 'data/cleaning_rota.json'
+DATA_FILE_BUFFER_SIZE = 64 * 1024
 
 # Create data directory if it doesn't exist
 os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
 
-# Data structure
-data = {
-    "members": [],
-    "tasks": [],
-    "assignments": []
+# Writes are coalesced: handlers mark the data dirty and flush_data persists it.
+# _data_lock guards all shared state below, as Flask serves requests on threads
+_dirty = threading.Event()
+_data_lock = threading.RLock()
+_flush_lock = threading.Lock()
+
+# Immediate flushes run on their own worker so they never queue behind Twilio sends
+_flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="data-flusher")
+
+# Data structure - members, tasks and assignments are stored in insertion-ordered
+# dicts keyed by id, with secondary indexes kept in sync by the index helpers
+members_by_id = {}
+members_by_phone = defaultdict(dict)
+tasks_by_id = {}
+tasks_by_lowername = defaultdict(dict)
+assignments_by_id = {}
+assignments_by_member = defaultdict(dict)
+assignments_by_task = defaultdict(dict)
+active_by_member = defaultdict(dict)
+assignments_by_due_date = defaultdict(dict)
+
+# Grouping indexes map a key to an insertion-ordered dict of the items sharing it,
+# since phone numbers, task names, etc. are not unique
+def add_to_group(index, key, item):
+    index[key][item["id"]] = item
+
+def remove_from_group(index, key, item):
+    group = index.get(key)
+    if group is not None:
+        group.pop(item["id"], None)
+        if not group:
+            del index[key]
+
+def index_member(member):
+    members_by_id[member["id"]] = member
+    add_to_group(members_by_phone, member["phone"], member)
+
+def unindex_member(member):
+    members_by_id.pop(member["id"], None)
+    remove_from_group(members_by_phone, member["phone"], member)
+
+# The first registered member with a phone number, as several may share it
+def find_member_by_phone(phone):
+    return next(iter(members_by_phone.get(phone, {}).values()), None)
+
+# Older data files may hold non-string task names and due dates, so index keys are
+# normalised to strings
+def task_name_key(task):
+    return str(task["name"]).lower()
+
+def due_date_key(assignment):
+    return str(assignment["due_date"])
+
+def index_task(task):
+    name_key = task_name_key(task)
+    tasks_by_id[task["id"]] = task
+    add_to_group(tasks_by_lowername, name_key, task)
+
+def unindex_task(task):
+    tasks_by_id.pop(task["id"], None)
+    remove_from_group(tasks_by_lowername, task_name_key(task), task)
+
+def index_assignment(assignment):
+    due_key = due_date_key(assignment)
+    assignments_by_id[assignment["id"]] = assignment
+    add_to_group(assignments_by_member, assignment["member_id"], assignment)
+    add_to_group(assignments_by_task, assignment["task_id"], assignment)
+    if not assignment["completed"]:
+        add_to_group(active_by_member, assignment["member_id"], assignment)
+        add_to_group(assignments_by_due_date, due_key, assignment)
+
+def unindex_assignment(assignment):
+    assignments_by_id.pop(assignment["id"], None)
+    remove_from_group(assignments_by_member, assignment["member_id"], assignment)
+    remove_from_group(assignments_by_task, assignment["task_id"], assignment)
+    deactivate_assignment(assignment)
+
+# Drop an assignment from the active indexes once it is completed or removed
+def deactivate_assignment(assignment):
+    remove_from_group(active_by_member, assignment["member_id"], assignment)
+    remove_from_group(assignments_by_due_date, due_date_key(assignment), assignment)
+
+# Fields each record type needs in order to be indexed
+INDEXED_FIELDS = {
+    "members": ("id", "phone"),
+    "tasks": ("id", "name"),
+    "assignments": ("id", "member_id", "task_id", "due_date", "completed")
 }
 
+# Rebuild the store from data in the file format, skipping records that cannot be indexed
+def build_indexes(data):
+    for index in (members_by_id, members_by_phone, tasks_by_id, tasks_by_lowername,
+                  assignments_by_id, assignments_by_member, assignments_by_task,
+                  active_by_member, assignments_by_due_date):
+        index.clear()
+    for kind, index_record in (("members", index_member), ("tasks", index_task),
+                               ("assignments", index_assignment)):
+        for record in data.get(kind, []):
+            try:
+                # Check the keys up front so a bad record is never partly indexed
+                missing = [field for field in INDEXED_FIELDS[kind] if field not in record]
+                if missing:
+                    raise ValueError(f"missing {', '.join(missing)}")
+                # Ids and phone numbers are used as dict keys as-is
+                for field in ("id", "phone", "member_id", "task_id"):
+                    if field in record and not isinstance(record[field], str):
+                        raise ValueError(f"{field} is not a string")
+                index_record(record)
+            except Exception as e:
+                logger.error(f"Skipping invalid record in {kind}: {record!r} ({str(e)})")
+
+# Current data in the file format
+def snapshot_data():
+    return {
+        "members": list(members_by_id.values()),
+        "tasks": list(tasks_by_id.values()),
+        "assignments": list(assignments_by_id.values())
+    }
+
 # Load data from file if exists
 def load_data():
-    global data
     try:
         if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r') as f:
-                data = json.load(f)
+            with open(DATA_FILE, 'rb', buffering=DATA_FILE_BUFFER_SIZE) as f:
+                data = orjson.loads(f.read())
                 logger.info("Data loaded successfully")
         else:
             # If no file exists, create default data
@@ -57,13 +217,13 @@ def load_data():
                 "members": [],
                 "tasks": [
                     {
-                        "id": str(uuid.uuid4()),
+                        "id": uuid.uuid4().hex,
                         "name": "Kitchen cleaning",
                         "description": "Clean kitchen surfaces and floor",
                         "frequency": "weekly"
                     },
                     {
-                        "id": str(uuid.uuid4()),
+                        "id": uuid.uuid4().hex,
                         "name": "Bathroom cleaning",
                         "description": "Clean bathroom, including shower, toilet and sink",
                         "frequency": "weekly"
@@ -73,27 +233,49 @@ def load_data():
             }
             save_data()
             logger.info("Default data created")
+        build_indexes(data)
     except Exception as e:
         logger.error(f"Error loading data: {str(e)}")
         # If there's an error, initialize with empty data
-        data = {"members": [], "tasks": [], "assignments": []}
+        build_indexes({"members": [], "tasks": [], "assignments": []})
 
-# Save data to file
+# Mark data as changed; it is written to file by the next flush_data run
 def save_data():
+    _dirty.set()
+
+# Flush data in the background now rather than waiting for the next timed flush
+def request_flush():
     try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
+        _flusher.submit(flush_data)
+    except RuntimeError:
+        # Shutting down: the exit flush will persist the change
+        pass
+
+# Write data to file if it changed since the last flush
+def flush_data():
+    with _flush_lock:
+        # Serialize under the data lock, but keep it released during file I/O
+        with _data_lock:
+            if not _dirty.is_set():
+                return
+            _dirty.clear()
+            payload = orjson.dumps(snapshot_data())
+        try:
+            # Write to a temporary file and swap it in so a crash never leaves a partial file
+            tmp_file = DATA_FILE + '.tmp'
+            with open(tmp_file, 'wb', buffering=DATA_FILE_BUFFER_SIZE) as f:
+                f.write(payload)
+            os.replace(tmp_file, DATA_FILE)
             logger.info("Data saved successfully")
-    except Exception as e:
-        logger.error(f"Error saving data: {str(e)}")
+        except Exception as e:
+            _dirty.set()
+            logger.error(f"Error saving data: {str(e)}")
 
 # Load data at startup
 load_data()
 
 # HTML Templates
-@app.route('/')
-def home_page():
-    return """
+HOME_PAGE_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -146,14 +328,52 @@ POST /api/members
         </div>
     </body>
     </html>
-    """
+    """.encode("utf-8")
+HOME_PAGE_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+# The home page is static, so it is encoded once at startup and cacheable by proxies
+@app.route('/')
+def home_page():
+    return Response(HOME_PAGE_HTML, mimetype="text/html", headers=HOME_PAGE_HEADERS)
+
+# Capture the request time once so handlers share a single formatted timestamp
+@app.before_request
+def capture_request_time():
+    g.now = datetime.now()
+    g.now_str = g.now.strftime("%Y-%m-%d %H:%M:%S")
 
 # API Endpoints
 
+# Valid task frequencies
+VALID_FREQUENCIES = ["daily", "weekly", "biweekly", "monthly"]
+
+# Error bodies for the common rejection paths, encoded once at startup
+def encode_error(message):
+    return orjson.dumps({"error": message})
+
+ERR_NAME_PHONE_REQUIRED = encode_error("Name and phone number required")
+ERR_PHONE_FORMAT = encode_error("Phone number must be in international format (starting with +)")
+ERR_MEMBER_NOT_FOUND = encode_error("Member not found")
+ERR_TASK_NAME_REQUIRED = encode_error("Task name required")
+ERR_TASK_NAME_INVALID = encode_error("Task name must be a string")
+ERR_TASK_NOT_FOUND = encode_error("Task not found")
+ERR_MEMBER_TASK_REQUIRED = encode_error("Member ID and Task ID required")
+ERR_MEMBER_TASK_INVALID = encode_error("Member ID and Task ID must be strings")
+ERR_DUE_DATE_INVALID = encode_error("Due date must be a string")
+ERR_ASSIGNMENT_EXISTS = encode_error("This assignment already exists")
+ERR_ASSIGNMENT_NOT_FOUND = encode_error("Assignment not found")
+ERR_TWILIO_NOT_CONFIGURED = encode_error("Twilio client not configured")
+ERR_INVALID_FREQUENCY = encode_error(f"Frequency must be one of: {', '.join(VALID_FREQUENCIES)}")
+
+def error_response(body, status):
+    return Response(body, status=status, mimetype="application/json")
+
 # Members endpoints
 @app.route('/api/members', methods=['GET'])
 def get_members():
-    return jsonify(data["members"])
+    with _data_lock:
+        members = list(members_by_id.values())
+    return jsonify(members)
 
 @app.route('/api/members', methods=['POST'])
 def add_member():
@@ -162,24 +382,25 @@ def add_member():
         
         # Validate required fields
         if not new_member or 'name' not in new_member or 'phone' not in new_member:
-            return jsonify({"error": "Name and phone number required"}), 400
+            return error_response(ERR_NAME_PHONE_REQUIRED, 400)
         
         # Validate phone number format
         phone = new_member['phone']
         if not phone.startswith('+'):
-            return jsonify({"error": "Phone number must be in international format (starting with +)"}), 400
+            return error_response(ERR_PHONE_FORMAT, 400)
         
         # Create member with UUID
-        member_id = str(uuid.uuid4())
+        member_id = uuid.uuid4().hex
         member = {
             "id": member_id,
             "name": new_member["name"],
             "phone": new_member["phone"],
-            "date_added": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "date_added": g.now_str
         }
         
-        data["members"].append(member)
-        save_data()
+        with _data_lock:
+            index_member(member)
+            save_data()
         
         return jsonify({"status": "success", "member": member}), 201
     except Exception as e:
@@ -189,20 +410,21 @@ def add_member():
 @app.route('/api/members/<member_id>', methods=['DELETE'])
 def delete_member(member_id):
     try:
-        # Find the member
-        for i, member in enumerate(data["members"]):
-            if member["id"] == member_id:
-                # Remove member
-                removed_member = data["members"].pop(i)
-                
-                # Remove any assignments for this member
-                data["assignments"] = [a for a in data["assignments"] 
-                                      if a["member_id"] != member_id]
-                
-                save_data()
-                return jsonify({"status": "success", "removed": removed_member})
-        
-        return jsonify({"error": "Member not found"}), 404
+        with _data_lock:
+            # Find the member
+            removed_member = members_by_id.get(member_id)
+            if not removed_member:
+                return error_response(ERR_MEMBER_NOT_FOUND, 404)
+            
+            # Remove member
+            unindex_member(removed_member)
+            
+            # Remove any assignments for this member
+            for assignment in list(assignments_by_member.get(member_id, {}).values()):
+                unindex_assignment(assignment)
+            
+            save_data()
+        return jsonify({"status": "success", "removed": removed_member})
     except Exception as e:
         logger.error(f"Error deleting member: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -210,7 +432,9 @@ def delete_member(member_id):
 # Tasks endpoints
 @app.route('/api/tasks', methods=['GET'])
 def get_tasks():
-    return jsonify(data["tasks"])
+    with _data_lock:
+        tasks = list(tasks_by_id.values())
+    return jsonify(tasks)
 
 @app.route('/api/tasks', methods=['POST'])
 def add_task():
@@ -219,29 +443,31 @@ def add_task():
         
         # Validate required fields
         if not new_task or 'name' not in new_task:
-            return jsonify({"error": "Task name required"}), 400
+            return error_response(ERR_TASK_NAME_REQUIRED, 400)
+        if not isinstance(new_task["name"], str):
+            return error_response(ERR_TASK_NAME_INVALID, 400)
         
         # Set defaults for optional fields
         description = new_task.get("description", "")
         frequency = new_task.get("frequency", "weekly")
         
         # Validate frequency
-        valid_frequencies = ["daily", "weekly", "biweekly", "monthly"]
-        if frequency not in valid_frequencies:
-            return jsonify({"error": f"Frequency must be one of: {', '.join(valid_frequencies)}"}), 400
+        if frequency not in VALID_FREQUENCIES:
+            return error_response(ERR_INVALID_FREQUENCY, 400)
         
         # Create task with UUID
-        task_id = str(uuid.uuid4())
+        task_id = uuid.uuid4().hex
         task = {
             "id": task_id,
             "name": new_task["name"],
             "description": description,
             "frequency": frequency,
-            "date_added": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "date_added": g.now_str
         }
         
-        data["tasks"].append(task)
-        save_data()
+        with _data_lock:
+            index_task(task)
+            save_data()
         
         return jsonify({"status": "success", "task": task}), 201
     except Exception as e:
@@ -251,20 +477,21 @@ def add_task():
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
     try:
-        # Find the task
-        for i, task in enumerate(data["tasks"]):
-            if task["id"] == task_id:
-                # Remove task
-                removed_task = data["tasks"].pop(i)
-                
-                # Remove any assignments for this task
-                data["assignments"] = [a for a in data["assignments"] 
-                                      if a["task_id"] != task_id]
-                
-                save_data()
-                return jsonify({"status": "success", "removed": removed_task})
-        
-        return jsonify({"error": "Task not found"}), 404
+        with _data_lock:
+            # Find the task
+            removed_task = tasks_by_id.get(task_id)
+            if not removed_task:
+                return error_response(ERR_TASK_NOT_FOUND, 404)
+            
+            # Remove task
+            unindex_task(removed_task)
+            
+            # Remove any assignments for this task
+            for assignment in list(assignments_by_task.get(task_id, {}).values()):
+                unindex_assignment(assignment)
+            
+            save_data()
+        return jsonify({"status": "success", "removed": removed_task})
     except Exception as e:
         logger.error(f"Error deleting task: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -274,25 +501,24 @@ def delete_task(task_id):
 def get_assignments():
     # Add member and task details to assignments for easier consumption
     enriched_assignments = []
-    for assignment in data["assignments"]:
-        enriched = assignment.copy()
-        
-        # Find member details
-        for member in data["members"]:
-            if member["id"] == assignment["member_id"]:
+    with _data_lock:
+        for assignment in assignments_by_id.values():
+            enriched = assignment.copy()
+            
+            # Find member details
+            member = members_by_id.get(assignment["member_id"])
+            if member:
                 enriched["member_name"] = member["name"]
                 enriched["member_phone"] = member["phone"]
-                break
-        
-        # Find task details
-        for task in data["tasks"]:
-            if task["id"] == assignment["task_id"]:
+            
+            # Find task details
+            task = tasks_by_id.get(assignment["task_id"])
+            if task:
                 enriched["task_name"] = task["name"]
                 enriched["task_description"] = task["description"]
                 enriched["task_frequency"] = task["frequency"]
-                break
-        
-        enriched_assignments.append(enriched)
+            
+            enriched_assignments.append(enriched)
     
     return jsonify(enriched_assignments)
 
@@ -303,52 +529,46 @@ def create_assignment():
         
         # Validate required fields
         if not assignment_data or 'member_id' not in assignment_data or 'task_id' not in assignment_data:
-            return jsonify({"error": "Member ID and Task ID required"}), 400
-        
-        # Verify member exists
-        member_exists = False
-        for member in data["members"]:
-            if member["id"] == assignment_data["member_id"]:
-                member_exists = True
-                member_name = member["name"]
-                break
-                
-        if not member_exists:
-            return jsonify({"error": "Member not found"}), 404
-        
-        # Verify task exists
-        task_exists = False
-        for task in data["tasks"]:
-            if task["id"] == assignment_data["task_id"]:
-                task_exists = True
-                task_name = task["name"]
-                break
-                
-        if not task_exists:
-            return jsonify({"error": "Task not found"}), 404
-        
-        # Check if this assignment already exists
-        for assignment in data["assignments"]:
-            if (assignment["member_id"] == assignment_data["member_id"] and 
-                assignment["task_id"] == assignment_data["task_id"]):
-                return jsonify({"error": "This assignment already exists"}), 409
-        
-        # Create assignment
-        assignment_id = str(uuid.uuid4())
-        due_date = assignment_data.get("due_date", (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d"))
-        
-        assignment = {
-            "id": assignment_id,
-            "member_id": assignment_data["member_id"],
-            "task_id": assignment_data["task_id"],
-            "assigned_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "due_date": due_date,
-            "completed": False,
-            "completion_date": None
-        }
-        
-        data["assignments"].append(assignment)
-        save_data()
+            return error_response(ERR_MEMBER_TASK_REQUIRED, 400)
+        if not isinstance(assignment_data["member_id"], str) or not isinstance(assignment_data["task_id"], str):
+            return error_response(ERR_MEMBER_TASK_INVALID, 400)
+        if not isinstance(assignment_data.get("due_date", ""), str):
+            return error_response(ERR_DUE_DATE_INVALID, 400)
+        
+        with _data_lock:
+            # Verify member exists
+            member = members_by_id.get(assignment_data["member_id"])
+            if not member:
+                return error_response(ERR_MEMBER_NOT_FOUND, 404)
+            member_name = member["name"]
+            
+            # Verify task exists
+            task = tasks_by_id.get(assignment_data["task_id"])
+            if not task:
+                return error_response(ERR_TASK_NOT_FOUND, 404)
+            task_name = task["name"]
+            
+            # Check if this assignment already exists
+            for assignment in assignments_by_member.get(assignment_data["member_id"], {}).values():
+                if assignment["task_id"] == assignment_data["task_id"]:
+                    return error_response(ERR_ASSIGNMENT_EXISTS, 409)
+            
+            # Create assignment
+            assignment_id = uuid.uuid4().hex
+            due_date = assignment_data.get("due_date", (g.now + timedelta(days=7)).strftime("%Y-%m-%d"))
+            
+            assignment = {
+                "id": assignment_id,
+                "member_id": assignment_data["member_id"],
+                "task_id": assignment_data["task_id"],
+                "assigned_date": g.now_str,
+                "due_date": due_date,
+                "completed": False,
+                "completion_date": None
+            }
+            
+            index_assignment(assignment)
+            save_data()
         
         # Return success with added member and task names for convenience
         return jsonify({
@@ -364,15 +584,17 @@ def create_assignment():
 @app.route('/api/assignments/<assignment_id>/complete', methods=['POST'])
 def complete_assignment(assignment_id):
     try:
-        # Find the assignment
-        for assignment in data["assignments"]:
-            if assignment["id"] == assignment_id:
-                assignment["completed"] = True
-                assignment["completion_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                save_data()
-                return jsonify({"status": "success", "assignment": assignment})
-        
-        return jsonify({"error": "Assignment not found"}), 404
+        with _data_lock:
+            # Find the assignment
+            assignment = assignments_by_id.get(assignment_id)
+            if not assignment:
+                return error_response(ERR_ASSIGNMENT_NOT_FOUND, 404)
+            
+            assignment["completed"] = True
+            assignment["completion_date"] = g.now_str
+            deactivate_assignment(assignment)
+            save_data()
+            return jsonify({"status": "success", "assignment": assignment})
     except Exception as e:
         logger.error(f"Error completing assignment: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -381,46 +603,46 @@ def complete_assignment(assignment_id):
 @app.route('/api/notify', methods=['POST'])
 def notify_all():
     if not client:
-        return jsonify({"error": "Twilio client not configured"}), 500
+        return error_response(ERR_TWILIO_NOT_CONFIGURED, 500)
     
     try:
         notifications_sent = []
-        current_date = datetime.now().strftime("%Y-%m-%d")
-        
-        # For each active assignment, send a notification
-        for assignment in data["assignments"]:
-            if not assignment["completed"]:
-                # Get member details
-                member = next((m for m in data["members"] if m["id"] == assignment["member_id"]), None)
-                if not member:
-                    continue
+        pending = {}
+        
+        with _data_lock:
+            # For each active assignment, queue a notification
+            for assignment in assignments_by_id.values():
+                if not assignment["completed"]:
+                    # Get member details
+                    member = members_by_id.get(assignment["member_id"])
+                    if not member:
+                        continue
+                        
+                    # Get task details
+                    task = tasks_by_id.get(assignment["task_id"])
+                    if not task:
+                        continue
                     
-                # Get task details
-                task = next((t for t in data["tasks"] if t["id"] == assignment["task_id"]), None)
-                if not task:
-                    continue
-                
-                # Create message
-                message_body = f"Hi {member['name']}! This is a reminder about your cleaning task: {task['name']}"
-                if task["description"]:
-                    message_body += f"\nDetails: {task['description']}"
-                message_body += f"\nDue date: {assignment['due_date']}"
-                
-                try:
-                    # Send WhatsApp message
-                    message = client.messages.create(
-                        body=message_body,
-                        from_=f"whatsapp:{twilio_whatsapp_number}",
-                        to=f"whatsapp:{member['phone']}"
-                    )
+                    # Create message
+                    message_body = format_task_message(NOTIFY_TEMPLATES, member, task,
+                                                       due_date=assignment["due_date"])
                     
-                    notifications_sent.append({
-                        "member": member["name"],
-                        "task": task["name"],
-                        "message_sid": message.sid
-                    })
-                except Exception as e:
-                    logger.error(f"Error sending notification to {member['name']}: {str(e)}")
+                    # Send WhatsApp message
+                    future = _sender.submit(send_whatsapp_message, member["phone"], message_body)
+                    pending[future] = (member, task)
+        
+        # Collect the results once all messages are in flight
+        for future, (member, task) in pending.items():
+            try:
+                message = future.result()
+                
+                notifications_sent.append({
+                    "member": member["name"],
+                    "task": task["name"],
+                    "message_sid": message.sid
+                })
+            except Exception as e:
+                logger.error(f"Error sending notification to {member['name']}: {str(e)}")
         
         return jsonify({"status": "success", "notifications_sent": notifications_sent})
     except Exception as e:
@@ -430,40 +652,36 @@ def notify_all():
 @app.route('/api/notify/<member_id>', methods=['POST'])
 def notify_member(member_id):
     if not client:
-        return jsonify({"error": "Twilio client not configured"}), 500
+        return error_response(ERR_TWILIO_NOT_CONFIGURED, 500)
     
     try:
-        # Find the member
-        member = next((m for m in data["members"] if m["id"] == member_id), None)
-        if not member:
-            return jsonify({"error": "Member not found"}), 404
+        with _data_lock:
+            # Find the member
+            member = members_by_id.get(member_id)
+            if not member:
+                return error_response(ERR_MEMBER_NOT_FOUND, 404)
+                
+            # Get the member's active assignments
+            active_assignments = list(active_by_member.get(member_id, {}).values())
             
-        # Get the member's active assignments
-        active_assignments = [a for a in data["assignments"] 
-                             if a["member_id"] == member_id and not a["completed"]]
-        
-        if not active_assignments:
-            return jsonify({"status": "success", "message": "No active assignments found for this member"})
-        
-        # Compile tasks into a single message
-        tasks_text = ""
-        for idx, assignment in enumerate(active_assignments, 1):
-            # Get task details
-            task = next((t for t in data["tasks"] if t["id"] == assignment["task_id"]), None)
-            if task:
-                tasks_text += f"{idx}. {task['name']} - Due: {assignment['due_date']}\n"
-                if task["description"]:
-                    tasks_text += f"   {task['description']}\n"
-        
-        message_body = f"Hi {member['name']}! Here are your cleaning tasks:\n\n{tasks_text}"
-        message_body += "\nReply with 'done [task name]' when you complete a task."
+            if not active_assignments:
+                return jsonify({"status": "success", "message": "No active assignments found for this member"})
+            
+            # Compile tasks into a single message
+            tasks_text = ""
+            for idx, assignment in enumerate(active_assignments, 1):
+                # Get task details
+                task = tasks_by_id.get(assignment["task_id"])
+                if task:
+                    tasks_text += f"{idx}. {task['name']} - Due: {assignment['due_date']}\n"
+                    if task["description"]:
+                        tasks_text += f"   {task['description']}\n"
+            
+            message_body = f"Hi {member['name']}! Here are your cleaning tasks:\n\n{tasks_text}"
+            message_body += "\nReply with 'done [task name]' when you complete a task."
         
         # Send WhatsApp message
-        message = client.messages.create(
-            body=message_body,
-            from_=f"whatsapp:{twilio_whatsapp_number}",
-            to=f"whatsapp:{member['phone']}"
-        )
+        message = send_whatsapp_message(member["phone"], message_body)
         
         return jsonify({
             "status": "success", 
@@ -489,58 +707,60 @@ def webhook():
         
         logger.info(f"Received message from {sender}: {incoming_msg}")
         
-        # Find the member by phone number
-        member = next((m for m in data["members"] if m["phone"] == sender), None)
-        
-        if not member:
-            response = "Sorry, your number is not registered in our system. Please contact the administrator."
-            return create_twilio_response(response)
-        
-        # Process commands
-        incoming_msg = incoming_msg.lower()
-        
-        if incoming_msg == 'tasks':
-            # List the member's tasks
-            active_assignments = [a for a in data["assignments"] 
-                                if a["member_id"] == member["id"] and not a["completed"]]
+        with _data_lock:
+            # Find the member by phone number
+            member = find_member_by_phone(sender)
             
-            if not active_assignments:
-                response = f"Hi {member['name']}! You don't have any active cleaning tasks."
-            else:
-                tasks_text = ""
-                for idx, assignment in enumerate(active_assignments, 1):
-                    task = next((t for t in data["tasks"] if t["id"] == assignment["task_id"]), None)
-                    if task:
-                        tasks_text += f"{idx}. {task['name']} - Due: {assignment['due_date']}\n"
+            if not member:
+                response = "Sorry, your number is not registered in our system. Please contact the administrator."
+                return create_twilio_response(response)
+            
+            # Process commands
+            incoming_msg = incoming_msg.lower()
+            
+            if incoming_msg == 'tasks':
+                # List the member's tasks
+                active_assignments = list(active_by_member.get(member["id"], {}).values())
                 
-                response = f"Hi {member['name']}! Here are your cleaning tasks:\n\n{tasks_text}"
-        
-        elif incoming_msg.startswith('done '):
-            # Mark a task as complete
-            task_name = incoming_msg[5:].strip().lower()
+                if not active_assignments:
+                    response = f"Hi {member['name']}! You don't have any active cleaning tasks."
+                else:
+                    tasks_text = ""
+                    for idx, assignment in enumerate(active_assignments, 1):
+                        task = tasks_by_id.get(assignment["task_id"])
+                        if task:
+                            tasks_text += f"{idx}. {task['name']} - Due: {assignment['due_date']}\n"
+                    
+                    response = f"Hi {member['name']}! Here are your cleaning tasks:\n\n{tasks_text}"
+            
+            elif incoming_msg.startswith('done '):
+                # Mark a task as complete
+                task_name = incoming_msg[5:].strip()
+                
+                # The message is already lower case, so it matches the case-folded task index.
+                # Several tasks may share a name, so accept an active assignment for any of them
+                matching_tasks = tasks_by_lowername.get(task_name, {})
+                assignment = next((a for a in active_by_member.get(member["id"], {}).values()
+                                   if a["task_id"] in matching_tasks), None)
+                
+                if assignment:
+                    assignment["completed"] = True
+                    assignment["completion_date"] = g.now_str
+                    deactivate_assignment(assignment)
+                    save_data()
+                    
+                    # Persist the completion off the request path; Twilio expects a prompt reply
+                    request_flush()
+                    response = f"Great job {member['name']}! The task '{task_name}' has been marked as complete."
+                else:
+                    response = f"Sorry {member['name']}, I couldn't find an active task named '{task_name}' assigned to you."
             
-            completed = False
-            for assignment in data["assignments"]:
-                if assignment["member_id"] == member["id"] and not assignment["completed"]:
-                    task = next((t for t in data["tasks"] if t["id"] == assignment["task_id"]), None)
-                    if task and task["name"].lower() == task_name:
-                        assignment["completed"] = True
-                        assignment["completion_date"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        completed = True
-                        save_data()
-                        break
+            elif incoming_msg == 'help':
+                response = f"Hi {member['name']}! Here are the available commands:\n\n• tasks - Get a list of your current tasks\n• done [task name] - Mark a task as complete\n• help - Show this help message"
             
-            if completed:
-                response = f"Great job {member['name']}! The task '{task_name}' has been marked as complete."
             else:
-                response = f"Sorry {member['name']}, I couldn't find an active task named '{task_name}' assigned to you."
-        
-        elif incoming_msg == 'help':
-            response = f"Hi {member['name']}! Here are the available commands:\n\n• tasks - Get a list of your current tasks\n• done [task name] - Mark a task as complete\n• help - Show this help message"
-        
-        else:
-            response = f"Hi {member['name']}! I didn't understand that command. Send 'help' to see available commands."
-        
+                response = f"Hi {member['name']}! I didn't understand that command. Send 'help' to see available commands."
+            
         return create_twilio_response(response)
     
     except Exception as e:
@@ -548,12 +768,11 @@ def webhook():
         return create_twilio_response("Sorry, there was an error processing your request.")
 
 def create_twilio_response(message):
-    return f"""
-    <?xml version="1.0" encoding="UTF-8"?>
-    <Response>
-        <Message>{message}</Message>
-    </Response>
-    """
+    # Escape the message so names and task text cannot break the TwiML document
+    return Response(
+        f'<?xml version="1.0" encoding="UTF-8"?><Response><Message>{escape(message)}</Message></Response>',
+        mimetype="application/xml"
+    )
 
 # Scheduled tasks
 
@@ -568,66 +787,77 @@ def check_due_tasks():
         current_date = datetime.now().strftime("%Y-%m-%d")
         tomorrow = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
         
-        # For each assignment due today or tomorrow, send a reminder
-        for assignment in data["assignments"]:
-            if not assignment["completed"] and (assignment["due_date"] == current_date or assignment["due_date"] == tomorrow):
-                # Get member details
-                member = next((m for m in data["members"] if m["id"] == assignment["member_id"]), None)
-                if not member:
-                    continue
+        with _data_lock:
+            # For each assignment due today or tomorrow, queue a reminder
+            pending = {}
+            due_assignments = [*assignments_by_due_date.get(current_date, {}).values(),
+                               *assignments_by_due_date.get(tomorrow, {}).values()]
+            for assignment in due_assignments:
+                if not assignment["completed"]:
+                    # Get member details
+                    member = members_by_id.get(assignment["member_id"])
+                    if not member:
+                        continue
+                        
+                    # Get task details
+                    task = tasks_by_id.get(assignment["task_id"])
+                    if not task:
+                        continue
                     
-                # Get task details
-                task = next((t for t in data["tasks"] if t["id"] == assignment["task_id"]), None)
-                if not task:
-                    continue
-                
-                # Determine urgency of message
-                if assignment["due_date"] == current_date:
-                    urgency = "due today"
-                else:
-                    urgency = "due tomorrow"
-                
-                # Create message
-                message_body = f"Hi {member['name']}! Reminder: Your cleaning task '{task['name']}' is {urgency}."
-                if task["description"]:
-                    message_body += f"\nDetails: {task['description']}"
-                
-                try:
-                    # Send WhatsApp message
-                    client.messages.create(
-                        body=message_body,
-                        from_=f"whatsapp:{twilio_whatsapp_number}",
-                        to=f"whatsapp:{member['phone']}"
-                    )
+                    # Determine urgency of message
+                    if assignment["due_date"] == current_date:
+                        urgency = "due today"
+                    else:
+                        urgency = "due tomorrow"
                     
-                    logger.info(f"Sent reminder to {member['name']} for task {task['name']}")
-                except Exception as e:
-                    logger.error(f"Error sending reminder to {member['name']}: {str(e)}")
+                    # Create message
+                    message_body = format_task_message(DUE_REMINDER_TEMPLATES, member, task,
+                                                       urgency=urgency)
+                    
+                    # Send WhatsApp message
+                    future = _sender.submit(send_whatsapp_message, member["phone"], message_body)
+                    pending[future] = (member, task)
+        
+        for future, (member, task) in pending.items():
+            try:
+                future.result()
+                logger.info(f"Sent reminder to {member['name']} for task {task['name']}")
+            except Exception as e:
+                logger.error(f"Error sending reminder to {member['name']}: {str(e)}")
         
     except Exception as e:
         logger.error(f"Error in scheduled task check: {str(e)}")
 
 # Set up scheduler
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=check_due_tasks, trigger="interval", hours=24, start_date='2023-01-01 08:00:00')
+# Runs never overlap, and missed runs collapse into one so members are not sent duplicate reminders
+scheduler.add_job(func=check_due_tasks, trigger="interval", hours=24, start_date='2023-01-01 08:00:00',
+                  coalesce=True, max_instances=1, misfire_grace_time=3600)
+scheduler.add_job(func=flush_data, trigger="interval", seconds=2, coalesce=True, max_instances=1)
 scheduler.start()
 
-# Shut down the scheduler when exiting the app
+# On exit, shut down the scheduler, then finish queued sends, then flush pending changes
+atexit.register(flush_data)
+atexit.register(_flusher.shutdown)
+atexit.register(_sender.shutdown)
 atexit.register(lambda: scheduler.shutdown())
 
 # Health check endpoint for monitoring
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({
+    # Monitors poll this often: the counts are O(1) dict sizes and the body is
+    # encoded directly with orjson rather than through jsonify
+    return Response(orjson.dumps({
         "status": "healthy",
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "timestamp": g.now_str,
         "twilio_configured": client is not None,
-        "members_count": len(data["members"]),
-        "tasks_count": len(data["tasks"]),
-        "assignments_count": len(data["assignments"])
-    })
+        "members_count": len(members_by_id),
+        "tasks_count": len(tasks_by_id),
+        "assignments_count": len(assignments_by_id)
+    }), mimetype="application/json")
 
-# Run the application
+# Run the application with the development server. In production gunicorn serves it
+# (see Procfile) from a single threaded worker, since all data lives in process memory
 if __name__ == '__main__':
     # Use the PORT environment variable provided by Render
     port = int(os.environ.get('PORT', 5000))